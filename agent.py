@@ -2,9 +2,203 @@
 Agent module: An agent that realizes three types of investment psychology
 Based on the BDI framework (Belief, Desire, Intention)
 """
+import functools
+import math
 import random
-from typing import Dict, List, Optional
-from llm_client import llm_client
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import AGENT_MEMORY_SIZE
+from llm_client import llm_client, MOCK_INTENTION_FNS
+from market import SENTIMENT_LABELS
+
+# intention response fields (an 'action:' line without a decision means hold)
+_ACTION_RE = re.compile(r'action:[^\n]*?(buy|sell|hold)|action:', re.IGNORECASE)
+_FALLBACK_ACTION_RE = re.compile(r'buy|sell', re.IGNORECASE)
+_QUANTITY_RE = re.compile(r'quantity:[^\d\n]*(\d+)', re.IGNORECASE)
+_REASON_RE = re.compile(r'reason:[ \t]*([^\n]{0,200})', re.IGNORECASE)  # reason capped at 200 characters
+
+# belief response keywords, matched as whole English words in one scan
+# (letter lookarounds instead of \b so keywords next to Chinese text still match)
+_POSITIVE_KEYWORDS = frozenset(('up', 'positive', 'optimistic'))
+_NEGATIVE_KEYWORDS = frozenset(('down', 'negative', 'pessimistic'))
+_KEYWORD_RE = re.compile(
+    r'(?<![a-z])(' + '|'.join(sorted(_POSITIVE_KEYWORDS | _NEGATIVE_KEYWORDS)) + r')(?![a-z])',
+    re.IGNORECASE
+)
+
+# LLM temperature of each decision
+BELIEF_TEMPERATURE = 0.7
+INTENTION_TEMPERATURE = 0.6
+
+# prompt quantization: agents of a type in near-identical states produce the same prompt (and LLM cache entry)
+PRICE_BUCKET = 0.5
+SENTIMENT_BUCKET = 0.05
+CASH_BUCKET = 100.0
+
+# sentiment score of each market outlook (-1 most pessimistic, 1 most optimistic)
+_SENTIMENT_SCORES = {
+    'very_positive': 0.9,
+    'positive': 0.6,
+    'slightly_positive': 0.3,
+    'neutral': 0.0,
+    'slightly_negative': -0.3,
+    'negative': -0.6,
+    'very_negative': -0.9
+}
+
+# persona description of each agent type
+_TYPE_DESCRIPTIONS = {
+    'optimistic': 'optimistic,tend to see the positive side,risk tolerance is high',
+    'pessimistic': 'pessimistic,tend to see the risk,risk tolerance is low',
+    'calm': 'calm,based on data analysis to make decisions'
+}
+
+# prompt templates: invariant persona and instructions first, so every call of an agent type shares the same prefix
+_BELIEF_TEMPLATE = """You are a {description} investor.
+
+Please analyze the market situation below and briefly state:
+1. your opinion on this news (1-2 sentences)
+2. your opinion on the price change (up/down/flat)
+3. your market outlook changed or not (positive/negative/neutral)
+
+Please answer in simple Chinese words
+
+the current market situation:
+- price: {price:.2f}
+- news: {news_content}
+- news sentiment: {news_sentiment}
+- market sentiment distribution: optimistic {optimistic:.2f}, pessimistic {pessimistic:.2f}, calm {calm:.2f}
+
+your current beliefs:
+- market outlook: {market_outlook}
+- risk tolerance: {risk_tolerance}"""
+
+_INTENTION_TEMPLATE = """You are a {description} investor.
+
+Please decide your investment action based on the situation below. You can only choose one of the following:
+1. buy (if you think the price will go up)
+2. sell (if you think the price will go down or need to sell)
+3. hold (if you think you should look on)
+
+Please answer in the following format:
+action: [buy/sell/hold]
+quantity: [if you buy, the maximum number of shares you can buy based on your cash; if you sell, the maximum number of shares you can sell based on your shares; if you hold, write 0]
+reason: [briefly explain the reason, 1-2 sentences]
+
+the current situation:
+- price: {price:.2f}
+- your cash: {cash:.2f}
+- your shares: {shares}
+- your market outlook: {market_outlook}"""
+
+def _build_templates(template: str) -> Dict[str, str]:
+    """pre-substitute the persona description of each agent type ('' for unknown types)"""
+    descriptions = dict(_TYPE_DESCRIPTIONS, **{'': ''})
+    return {
+        agent_type: template.replace('{description}', description)
+        for agent_type, description in descriptions.items()
+    }
+
+BELIEF_TEMPLATES: Dict[str, str] = _build_templates(_BELIEF_TEMPLATE)
+INTENTION_TEMPLATES: Dict[str, str] = _build_templates(_INTENTION_TEMPLATE)
+
+
+def _bucket(value: float, step: float, rounding=round) -> float:
+    """round value to a multiple of step (nearest by default, pass math.floor/math.ceil to round down/up)"""
+    return rounding(value / step) * step
+
+
+def _canonical_news(content: str) -> str:
+    """canonical form of a news content (case and whitespace insensitive)"""
+    return ' '.join(content.split()).lower()
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_raw(response: str) -> Tuple[str, int, str]:
+    """
+    Parse the fields of an intention response, independent of the agent
+    (cached, since repeated responses are common with the LLM caches)
+    
+    Returns:
+        Tuple: (action, quantity, reason), quantity is 0 when the response does not give one
+    """
+    # default hold
+    action = 'hold'
+    quantity = 0
+    
+    # Try to extract quantity from response first
+    quantity_match = _QUANTITY_RE.search(response)
+    if quantity_match:
+        quantity = int(quantity_match.group(1))
+    
+    # parse action (compatible with replies that do not strictly follow the format)
+    action_match = _ACTION_RE.search(response)
+    if action_match:
+        action = (action_match.group(1) or 'hold').lower()
+    else:
+        # fallback: as long as the buy/sell keywords appear, execute
+        keyword_match = _FALLBACK_ACTION_RE.search(response)
+        action = keyword_match.group().lower() if keyword_match else 'hold'
+    
+    # extract reason
+    reason_match = _REASON_RE.search(response)
+    reason = reason_match.group(1).strip() if reason_match else response[:100]  # response as reason if no reason field
+    
+    return action, quantity, reason
+
+
+class TradeBuffer:
+    """Trade history stored as columnar NumPy arrays, doubled in capacity when full"""
+    
+    ACTION_CODES = {'buy': 1, 'sell': 2}
+    ACTIONS = np.array(['', 'buy', 'sell'])
+    
+    def __init__(self, capacity: int = 64):
+        """
+        Initialize buffer
+        
+        Args:
+            capacity: initial number of trade slots
+        """
+        self.action_code = np.zeros(capacity, dtype=np.uint8)
+        self.quantity = np.zeros(capacity, dtype=np.int32)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.timestep = np.zeros(capacity, dtype=np.int32)
+        self.size = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def append(self, action: str, quantity: int, price: float, timestep: int):
+        """write a trade into the next slot"""
+        if self.size == len(self.quantity):
+            self._grow()
+        i = self.size
+        self.action_code[i] = self.ACTION_CODES[action]
+        self.quantity[i] = quantity
+        self.price[i] = price
+        self.timestep[i] = timestep
+        self.size += 1
+    
+    def _grow(self):
+        """double the capacity of every column"""
+        for column in ('action_code', 'quantity', 'price', 'timestep'):
+            old = getattr(self, column)
+            new = np.zeros(2 * len(old), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
+    
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """recorded trades as columns, ready for a single DataFrame construction"""
+        n = self.size
+        return {
+            'timestep': self.timestep[:n],
+            'action': self.ACTIONS[self.action_code[:n]],
+            'quantity': self.quantity[:n],
+            'price': self.price[:n]
+        }
 
 class Agent:
     """Basic agent class"""
@@ -24,9 +218,17 @@ class Agent:
         self.shares = 0
         self.beliefs = {}  # beliefs about the market
         self.desires = {}  # desires: investment goals
-        self.intentions = []  # intentions: planned actions
-        self.opinions = []  # opinions: published opinions
-        self.trade_history = []  # trade history
+        self.intentions = deque(maxlen=AGENT_MEMORY_SIZE)  # intentions: planned actions (latest only)
+        self.opinions = deque(maxlen=AGENT_MEMORY_SIZE)  # opinions: published opinions (latest only)
+        self.opinion_count = 0  # number of opinions published so far
+        self.trade_history = TradeBuffer()  # trade history
+        
+        # situation of the last LLM belief update / intention formation (see reuse_beliefs / reuse_intention)
+        self._last_belief_key = None
+        self._last_intention_key = None
+        self._sentiment_score = None  # cached get_sentiment_score, cleared when beliefs are updated
+        # mock intention of the agent type, used instead of formatting and scanning a prompt in mock mode
+        self._mock_fn = MOCK_INTENTION_FNS.get(agent_type, MOCK_INTENTION_FNS['calm'])
         
         # initialize beliefs and desires based on agent type
         self._initialize_personality()
@@ -51,71 +253,112 @@ class Agent:
         update beliefs: based on news, price and market sentiment
         
         Args:
-            news: news information {'content': str, 'sentiment': 'positive'/'negative'/'neutral'}
+            news: news information {'content': str, 'sentiment': POS/NEG/NEU}
             current_price: current price
             market_sentiment: market sentiment {'optimistic': float, 'pessimistic': float, 'calm': float}
         """
+        if self.reuse_beliefs(news, current_price, market_sentiment):
+            return
+        
         # update beliefs using LLM
-        prompt = self._create_belief_update_prompt(news, current_price, market_sentiment)
-        messages = [{"role": "user", "content": prompt}]
-        response = llm_client.generate_response(messages, temperature=0.7)
+        messages = self.build_belief_messages(news, current_price, market_sentiment)
+        response = llm_client.generate_response(
+            messages, temperature=BELIEF_TEMPERATURE,
+            semantic_key=self.belief_semantic_key(news, current_price, market_sentiment)
+        )
         
         # parse response and update beliefs
+        self.apply_belief_response(response, news)
+    
+    def reuse_beliefs(self, news: Dict, current_price: float, market_sentiment: Dict) -> bool:
+        """
+        skip a low-salience belief update: if news sentiment, price and market sentiment are unchanged
+        since the last LLM update, the previous opinion is repeated instead of querying the LLM
+        
+        Returns:
+            bool: True if the previous opinion was reused (no LLM call needed)
+        """
+        key = (
+            news['sentiment'],
+            _bucket(current_price, PRICE_BUCKET),
+            tuple(_bucket(value, SENTIMENT_BUCKET) for value in market_sentiment.values())
+        )
+        if key == self._last_belief_key and self.opinions:
+            self._save_opinion(news['content'], self.opinions[-1]['response'])
+            return True
+        self._last_belief_key = key
+        return False
+    
+    def build_belief_messages(self, news: Dict, current_price: float, market_sentiment: Dict) -> List[Dict]:
+        """build the LLM messages of a belief update (lets the simulator batch all agents into one request)"""
+        prompt = self._create_belief_update_prompt(news, current_price, market_sentiment)
+        return [{"role": "user", "content": prompt}]
+    
+    def belief_semantic_key(self, news: Dict, current_price: float, market_sentiment: Dict) -> Tuple[Tuple, str]:
+        """
+        semantic cache key of a belief update: everything but the news text must match exactly,
+        only the news text may be matched by meaning
+        
+        Returns:
+            tuple: (namespace, news text)
+        """
+        namespace = (
+            'belief',
+            self.agent_type,
+            _bucket(current_price, PRICE_BUCKET),
+            news['sentiment'],
+            tuple(_bucket(value, SENTIMENT_BUCKET) for value in market_sentiment.values()),
+            self.beliefs.get('market_outlook', 'unknown'),
+            self.beliefs.get('risk_tolerance', 'unknown')
+        )
+        return namespace, _canonical_news(news['content'])
+    
+    def apply_belief_response(self, response: str, news: Dict):
+        """update beliefs from the LLM response of a belief update"""
         self._parse_belief_response(response, news)
     
     def _create_belief_update_prompt(self, news: Dict, current_price: float, market_sentiment: Dict) -> str:
         """create belief update prompt"""
-        prompt = f"""You are a {self._get_type_description()} investor, named {self.name}.
-
-the current market situation:
-- price: {current_price:.2f}
-- news: {news['content']}
-- news sentiment: {news['sentiment']}
-- market sentiment distribution: optimistic {market_sentiment.get('optimistic', 0):.2f}, pessimistic {market_sentiment.get('pessimistic', 0):.2f}, calm {market_sentiment.get('calm', 0):.2f}
-
-your current beliefs:
-- market outlook: {self.beliefs.get('market_outlook', 'unknown')}
-- risk tolerance: {self.beliefs.get('risk_tolerance', 'unknown')}
-
-Please analyze the current situation and briefly state:
-1. your opinion on this news (1-2 sentences)
-2. your opinion on the price change (up/down/flat)
-3. your market outlook changed or not (positive/negative/neutral)
-
-Please answer in simple Chinese words"""
-        return prompt
-    
-    def _get_type_description(self) -> str:
-        """get type description"""
-        descriptions = {
-            'optimistic': 'optimistic,tend to see the positive side,risk tolerance is high',
-            'pessimistic': 'pessimistic,tend to see the risk,risk tolerance is low',
-            'calm': 'calm,based on data analysis to make decisions'
-        }
-        return descriptions.get(self.agent_type, '')
+        template = BELIEF_TEMPLATES.get(self.agent_type, BELIEF_TEMPLATES[''])
+        return template.format(
+            price=_bucket(current_price, PRICE_BUCKET),
+            news_content=_canonical_news(news['content']),
+            news_sentiment=SENTIMENT_LABELS.get(news['sentiment'], 'neutral'),
+            optimistic=_bucket(market_sentiment.get('optimistic', 0), SENTIMENT_BUCKET),
+            pessimistic=_bucket(market_sentiment.get('pessimistic', 0), SENTIMENT_BUCKET),
+            calm=_bucket(market_sentiment.get('calm', 0), SENTIMENT_BUCKET),
+            market_outlook=self.beliefs.get('market_outlook', 'unknown'),
+            risk_tolerance=self.beliefs.get('risk_tolerance', 'unknown')
+        )
     
     def _parse_belief_response(self, response: str, news: Dict):
         """parse LLM response and update beliefs"""
         # simple keyword matching to update beliefs
-        response_lower = response.lower()
+        hits = {match.group(1).lower() for match in _KEYWORD_RE.finditer(response)}
         
-        if 'up' in response or 'positive' in response_lower or 'optimistic' in response:
+        if hits & _POSITIVE_KEYWORDS:
             if self.agent_type == 'optimistic':
                 self.beliefs['market_outlook'] = 'very_positive'
             elif self.agent_type == 'pessimistic':
                 self.beliefs['market_outlook'] = 'slightly_positive'
-        elif 'down' in response or 'negative' in response_lower or 'pessimistic' in response:
+        elif hits & _NEGATIVE_KEYWORDS:
             if self.agent_type == 'pessimistic':
                 self.beliefs['market_outlook'] = 'very_negative'
             elif self.agent_type == 'optimistic':
                 self.beliefs['market_outlook'] = 'slightly_negative'
+        self._sentiment_score = None
         
         # save opinions
+        self._save_opinion(news['content'], response)
+    
+    def _save_opinion(self, news_content: str, response: str):
+        """save a published opinion"""
         self.opinions.append({
-            'news': news['content'],
+            'news': news_content,
             'response': response,
-            'timestamp': len(self.opinions)
+            'timestamp': self.opinion_count
         })
+        self.opinion_count += 1
     
     def form_intention(self, current_price: float) -> Dict:
         """
@@ -124,79 +367,70 @@ Please answer in simple Chinese words"""
         Returns:
             Dict: {'action': 'buy'/'sell'/'hold', 'quantity': int, 'reason': str}
         """
+        intention = self.reuse_intention(current_price)
+        if intention is not None:
+            return intention
+        
         # use LLM to form intention
-        prompt = self._create_intention_prompt(current_price)
-        messages = [{"role": "user", "content": prompt}]
-        response = llm_client.generate_response(messages, temperature=0.6)
+        if llm_client.is_mock:
+            response = self.mock_intention_response()
+        else:
+            messages = self.build_intention_messages(current_price)
+            response = llm_client.generate_response(messages, temperature=INTENTION_TEMPERATURE)
         
         # parse response
+        return self.apply_intention_response(response, current_price)
+    
+    def reuse_intention(self, current_price: float) -> Optional[Dict]:
+        """
+        skip a low-salience intention formation: if market outlook, cash, shares and price are unchanged
+        since the last LLM decision, the previous intention is repeated instead of querying the LLM
+        
+        Returns:
+            Dict: the reused intention, or None if the LLM has to be queried
+        """
+        key = (
+            self.beliefs.get('market_outlook'),
+            _bucket(self.cash, CASH_BUCKET, math.floor),
+            self.shares,
+            _bucket(current_price, PRICE_BUCKET, math.ceil)
+        )
+        if key == self._last_intention_key and self.intentions:
+            intention = dict(self.intentions[-1])
+            self.intentions.append(intention)
+            return intention
+        self._last_intention_key = key
+        return None
+    
+    def build_intention_messages(self, current_price: float) -> List[Dict]:
+        """build the LLM messages of intention formation (lets the simulator batch all agents into one request)"""
+        prompt = self._create_intention_prompt(current_price)
+        return [{"role": "user", "content": prompt}]
+    
+    def mock_intention_response(self) -> str:
+        """mock response of intention formation (mock mode), dispatched on the agent type without building a prompt"""
+        return self._mock_fn(self.shares > 0)
+    
+    def apply_intention_response(self, response: str, current_price: float) -> Dict:
+        """form and record the intention from the LLM response of intention formation"""
         intention = self._parse_intention_response(response, current_price)
         self.intentions.append(intention)
         return intention
     
     def _create_intention_prompt(self, current_price: float) -> str:
         """create intention formation prompt"""
-        prompt = f"""You are{self.name}, a {self._get_type_description()} investor.
-
-the current situation:
-- price: {current_price:.2f}
-- your cash: {self.cash:.2f}
-- your shares: {self.shares}
-- your market outlook: {self.beliefs.get('market_outlook', 'unknown')}
-
-Please decide your investment action. You can only choose one of the following:
-1. buy (if you think the price will go up)
-2. sell (if you think the price will go down or need to sell)
-3. hold (if you think you should look on)
-
-Please answer in the following format:
-action: [buy/sell/hold]
-quantity: [if you buy, the maximum number of shares you can buy based on your cash; if you sell, the maximum number of shares you can sell based on your shares; if you hold, write 0]
-reason: [briefly explain the reason, 1-2 sentences]"""
-        return prompt
+        template = INTENTION_TEMPLATES.get(self.agent_type, INTENTION_TEMPLATES[''])
+        # cash rounded down and price rounded up, so the maximum the LLM computes is always affordable
+        return template.format(
+            price=_bucket(current_price, PRICE_BUCKET, math.ceil),
+            cash=_bucket(self.cash, CASH_BUCKET, math.floor),
+            shares=self.shares,
+            market_outlook=self.beliefs.get('market_outlook', 'unknown')
+        )
     
     def _parse_intention_response(self, response: str, current_price: float) -> Dict:
         """parse intention response"""
-        response_lower = response.lower()
-        
-        # default hold
-        action = 'hold'
-        quantity = 0
-        reason = "looking on"
-        
-        # Try to extract quantity from response first
-        if 'quantity:' in response_lower:
-            try:
-                quantity_start = response_lower.find('quantity:')
-                if quantity_start != -1:
-                    quantity_str = response[quantity_start:].split('\n')[0].replace('quantity:', '').strip()
-                    # Extract number from string
-                    import re
-                    numbers = re.findall(r'\d+', quantity_str)
-                    if numbers:
-                        parsed_quantity = int(numbers[0])
-                        if parsed_quantity > 0:
-                            quantity = parsed_quantity
-            except:
-                pass
-        
-        # parse action (compatible with replies that do not strictly follow the format)
-        if 'action:' in response_lower:
-            action_line = response_lower[response_lower.find('action:'):].split('\n')[0]
-            if 'buy' in action_line:
-                action = 'buy'
-            elif 'sell' in action_line:
-                action = 'sell'
-            else:
-                action = 'hold'
-        else:
-            # fallback: as long as the buy/sell keywords appear, execute
-            if 'buy' in response_lower:
-                action = 'buy'
-            elif 'sell' in response_lower:
-                action = 'sell'
-            else:
-                action = 'hold'
+        action, quantity, reason = _parse_raw(response)
         
         # If quantity was not parsed from response, calculate it based on action and agent type
         if quantity == 0:
@@ -219,15 +453,8 @@ reason: [briefly explain the reason, 1-2 sentences]"""
                     else:
                         quantity = max(1, int(self.shares * 0.4))  # calm investor sells 40%
                     quantity = min(quantity, self.shares)  # not more than the shares
-        
-        # extract reason
-        if 'reason:' in response_lower:
-            reason_start = response.find('reason:')
-            if reason_start != -1:
-                reason = response[reason_start:].split('\n')[0].replace('reason:', '').strip()
-        else:
-            # Use response as reason if no reason field
-            reason = response[:100]  # Limit length
+        elif action == 'buy':
+            quantity = min(quantity, int(self.cash / current_price))  # not more than the cash allows
         
         return {
             'action': action,
@@ -236,10 +463,15 @@ reason: [briefly explain the reason, 1-2 sentences]"""
             'response': response
         }
     
-    def execute_trade(self, intention: Dict, current_price: float) -> Optional[Dict]:
+    def execute_trade(self, intention: Dict, current_price: float, timestep: int = 0) -> Optional[Dict]:
         """
         execute trade
         
+        Args:
+            intention: intention formed in this step
+            current_price: current price
+            timestep: time step recorded in the trade history
+        
         Returns:
             Dict: trade record {'action': str, 'quantity': int, 'price': float, 'timestamp': int}
         """
@@ -257,7 +489,7 @@ reason: [briefly explain the reason, 1-2 sentences]"""
                     'price': current_price,
                     'cost': cost
                 }
-                self.trade_history.append(trade)
+                self.trade_history.append('buy', quantity, current_price, timestep)
                 return trade
         
         elif action == 'sell' and quantity > 0:
@@ -271,7 +503,7 @@ reason: [briefly explain the reason, 1-2 sentences]"""
                     'price': current_price,
                     'revenue': revenue
                 }
-                self.trade_history.append(trade)
+                self.trade_history.append('sell', quantity, current_price, timestep)
                 return trade
         
         return None
@@ -282,15 +514,7 @@ reason: [briefly explain the reason, 1-2 sentences]"""
     
     def get_sentiment_score(self) -> float:
         """get sentiment score (-1 to 1, -1 most pessimistic, 1 most optimistic)"""
-        outlook = self.beliefs.get('market_outlook', 'neutral')
-        scores = {
-            'very_positive': 0.9,
-            'positive': 0.6,
-            'slightly_positive': 0.3,
-            'neutral': 0.0,
-            'slightly_negative': -0.3,
-            'negative': -0.6,
-            'very_negative': -0.9
-        }
-        return scores.get(outlook, 0.0)
+        if self._sentiment_score is None:
+            self._sentiment_score = _SENTIMENT_SCORES.get(self.beliefs.get('market_outlook', 'neutral'), 0.0)
+        return self._sentiment_score
 
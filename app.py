@@ -1,6 +1,7 @@
 """
 Streamlit Interactive Interface: Visual Market simulation
 """
+from itertools import islice
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
@@ -9,6 +10,7 @@ from plotly.subplots import make_subplots
 import numpy as np
 from simulator import MarketSimulator
 from config import INITIAL_STOCK_PRICE
+from market import NEU, SENTIMENT_LABELS
 
 # page configuration
 st.set_page_config(
@@ -41,6 +43,89 @@ def get_simulator():
         st.session_state['simulator'] = MarketSimulator(INITIAL_STOCK_PRICE)
     return st.session_state['simulator']
 
+# DataFrames cached in session state across reruns
+CACHED_FRAMES = ('history_df', 'trades_df', 'agents_df')
+
+# figures cached in session state across reruns
+CACHED_FIGURES = ('price_sentiment_fig', 'volume_fig')
+
+# columns of the cached price and sentiment history
+HISTORY_COLUMNS = ['timestep', 'price', 'optimistic', 'pessimistic', 'calm']
+
+# columns of the cached trade records
+TRADE_COLUMNS = ['timestep', 'agent_name', 'agent_type', 'action', 'quantity', 'price']
+
+def get_history_df() -> pd.DataFrame:
+    """get price and sentiment history, appending only the rows of the steps added since the last rerun"""
+    sim = get_simulator()
+    history = sim.simulation_history
+    total_steps = sim.market.timestep  # counts every step, also those dropped from a bounded history
+    df, num_steps = st.session_state.get('history_df', (None, 0))
+    if df is None or num_steps > total_steps:
+        df, num_steps = pd.DataFrame(columns=HISTORY_COLUMNS), 0
+    
+    if num_steps < total_steps:
+        new_steps = min(total_steps - num_steps, len(history))
+        rows = []
+        for h in islice(history, len(history) - new_steps, None):
+            sentiment = h.get('market_sentiment', {})
+            rows.append((
+                h['timestep'],
+                h['price'],
+                sentiment.get('optimistic', 0),
+                sentiment.get('pessimistic', 0),
+                sentiment.get('calm', 0)
+            ))
+        if rows:
+            new_rows = pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+            df = new_rows if df.empty else pd.concat([df, new_rows], ignore_index=True)
+        num_steps = total_steps
+    
+    st.session_state['history_df'] = (df, num_steps)
+    return df
+
+def get_step_cached(state_key: str, build):
+    """
+    get a cached value, rebuilt only when a step was added since the last rerun (e.g. not on tab switches)
+    
+    Args:
+        state_key: session state key of the cached value
+        build: function building the value
+    """
+    num_steps = get_simulator().market.timestep
+    value, cached_steps = st.session_state.get(state_key, (None, 0))
+    if value is None or cached_steps != num_steps:
+        value = build()
+        st.session_state[state_key] = (value, num_steps)
+    return value
+
+def _build_trades_df() -> pd.DataFrame:
+    """build all trade records column-wise from the agents' trade buffers"""
+    frames = []
+    for agent in get_simulator().agents:
+        if len(agent.trade_history) == 0:
+            continue
+        columns = agent.trade_history.to_columns()
+        columns['agent_name'] = agent.name
+        columns['agent_type'] = agent.agent_type
+        frames.append(pd.DataFrame(columns, columns=TRADE_COLUMNS))
+    if not frames:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values('timestep', kind='stable', ignore_index=True)
+
+def get_trades_df() -> pd.DataFrame:
+    """get all trade records"""
+    return get_step_cached('trades_df', _build_trades_df)
+
+def get_agents_df() -> pd.DataFrame:
+    """get agent states of the latest step"""
+    history = get_simulator().simulation_history
+    return get_step_cached(
+        'agents_df',
+        lambda: pd.DataFrame(history[-1].get('agent_states', {}) if history else {})
+    )
+
 def main():
     """main function"""
     # ensure session state is initialized
@@ -61,6 +146,8 @@ def main():
         if st.button("🔄 Reset Simulation"):
             sim = get_simulator()
             sim.reset()
+            for key in CACHED_FRAMES + CACHED_FIGURES:
+                st.session_state.pop(key, None)
             st.session_state.is_running = False
             st.session_state.auto_step = False
             rerun()
@@ -88,7 +175,7 @@ def main():
             price_change_pct = stats.get('price_change_pct', 0)
             st.metric("price change percentage", f"{price_change_pct:.2f}%")
             st.metric("total trades", stats.get('total_trades', 0))
-            st.metric("time step", len(sim.simulation_history))
+            st.metric("time step", sim.market.timestep)
     
     # main content area
     sim = get_simulator()
@@ -99,6 +186,7 @@ def main():
     if sim.simulation_history:
         latest_step = sim.simulation_history[-1]
         news = latest_step.get('news', {})
+        sentiment = SENTIMENT_LABELS.get(news.get('sentiment', NEU), 'neutral')
         
         # news card
         sentiment_emoji = {
@@ -113,12 +201,12 @@ def main():
         }
         
         st.markdown(f"""
-        <div style="padding: 15px; border-left: 4px solid {sentiment_color.get(news.get('sentiment', 'neutral'), 'gray')}; 
+        <div style="padding: 15px; border-left: 4px solid {sentiment_color.get(sentiment, 'gray')}; 
                     background-color: #f0f0f0; border-radius: 5px; margin-bottom: 20px;">
-            <h3>{sentiment_emoji.get(news.get('sentiment', 'neutral'), '📄')} Latest News</h3>
+            <h3>{sentiment_emoji.get(sentiment, '📄')} Latest News</h3>
             <p style="font-size: 16px;">{news.get('content', 'No news')}</p>
-            <p style="color: {sentiment_color.get(news.get('sentiment', 'neutral'), 'gray')}; 
-                      font-weight: bold;">sentiment: {news.get('sentiment', 'neutral')}</p>
+            <p style="color: {sentiment_color.get(sentiment, 'gray')}; 
+                      font-weight: bold;">sentiment: {sentiment}</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -148,30 +236,15 @@ def main():
         elif selected_tab == tab_options[3]:
             show_market_statistics()
 
-def show_price_sentiment_chart():
-    """show price and sentiment chart"""
-    sim = get_simulator()
-    history = sim.simulation_history
-    market = sim.market
-    
-    if len(history) < 2:
-        st.info("At least 2 time steps are required to display the chart")
-        return
-    
-    # prepare data
-    timesteps = [h['timestep'] for h in history]
-    prices = [h['price'] for h in history]
+def build_price_sentiment_figure(df_history: pd.DataFrame, initial_price: float) -> go.Figure:
+    """build price and sentiment figure"""
+    timesteps = df_history['timestep'].to_numpy()
+    prices = df_history['price'].to_numpy()
     
-    # calculate sentiment index
-    optimistic_scores = []
-    pessimistic_scores = []
-    calm_scores = []
-    
-    for h in history:
-        sentiment = h.get('market_sentiment', {})
-        optimistic_scores.append(sentiment.get('optimistic', 0))
-        pessimistic_scores.append(sentiment.get('pessimistic', 0))
-        calm_scores.append(sentiment.get('calm', 0))
+    # sentiment index
+    optimistic_scores = df_history['optimistic'].to_numpy()
+    pessimistic_scores = df_history['pessimistic'].to_numpy()
+    calm_scores = df_history['calm'].to_numpy()
     
     # create subplots
     fig = make_subplots(
@@ -181,68 +254,78 @@ def show_price_sentiment_chart():
         row_heights=[0.6, 0.4]
     )
     
-    # price chart
-    fig.add_trace(
-        go.Scatter(
-            x=timesteps,
-            y=prices,
-            mode='lines+markers',
-            name='Stock Price',
-            line=dict(color='blue', width=2),
-            marker=dict(size=4)
-        ),
-        row=1, col=1
+    # price chart (row 1) and sentiment chart (row 2), added in a single call
+    # (WebGL traces keep long histories smooth in the browser)
+    fig.add_traces(
+        [
+            go.Scattergl(
+                x=timesteps,
+                y=prices,
+                mode='lines+markers',
+                name='Stock Price',
+                line=dict(color='blue', width=2),
+                marker=dict(size=4)
+            ),
+            go.Scattergl(
+                x=timesteps,
+                y=optimistic_scores,
+                mode='lines',
+                name='Optimistic Sentiment',
+                line=dict(color='green', width=2)
+            ),
+            go.Scattergl(
+                x=timesteps,
+                y=pessimistic_scores,
+                mode='lines',
+                name='Pessimistic Sentiment',
+                line=dict(color='red', width=2)
+            ),
+            go.Scattergl(
+                x=timesteps,
+                y=calm_scores,
+                mode='lines',
+                name='Calm Sentiment',
+                line=dict(color='gray', width=2)
+            )
+        ],
+        rows=[1, 2, 2, 2], cols=[1, 1, 1, 1]
     )
     
     # add base value line
     fig.add_hline(
-        y=market.initial_price,
+        y=initial_price,
         line_dash="dash",
         line_color="gray",
         annotation_text="Initial Price",
         row=1, col=1
     )
     
-    # sentiment chart
-    fig.add_trace(
-        go.Scatter(
-            x=timesteps,
-            y=optimistic_scores,
-            mode='lines',
-            name='Optimistic Sentiment',
-            line=dict(color='green', width=2)
-        ),
-        row=2, col=1
-    )
-    
-    fig.add_trace(
-        go.Scatter(
-            x=timesteps,
-            y=pessimistic_scores,
-            mode='lines',
-            name='Pessimistic Sentiment',
-            line=dict(color='red', width=2)
-        ),
-        row=2, col=1
-    )
-    
-    fig.add_trace(
-        go.Scatter(
-            x=timesteps,
-            y=calm_scores,
-            mode='lines',
-            name='Calm Sentiment',
-            line=dict(color='gray', width=2)
-        ),
-        row=2, col=1
-    )
-    
     # update layout
     fig.update_xaxes(title_text="Time Step", row=2, col=1)
     fig.update_yaxes(title_text="Price (¥)", row=1, col=1)
     fig.update_yaxes(title_text="Sentiment Score", row=2, col=1)
     fig.update_layout(height=700, showlegend=True)
     
+    return fig
+
+def show_price_sentiment_chart():
+    """show price and sentiment chart"""
+    sim = get_simulator()
+    history = sim.simulation_history
+    market = sim.market
+    
+    if len(history) < 2:
+        st.info("At least 2 time steps are required to display the chart")
+        return
+    
+    # prepare data (the figure is rebuilt only when a step was added)
+    df_history = get_history_df()
+    prices = df_history['price'].to_numpy()
+    fig = get_step_cached(
+        'price_sentiment_fig',
+        lambda: build_price_sentiment_figure(df_history, market.initial_price)
+    )
+    
     st.plotly_chart(fig)
     
     # display key information
@@ -263,6 +346,40 @@ def show_price_sentiment_chart():
         volatility = np.std(np.diff(prices) / prices[:-1]) if len(prices) > 1 else 0
         st.metric("volatility", f"{volatility:.4f}")
 
+def build_volume_figure(df_trades: pd.DataFrame) -> go.Figure:
+    """build trading volume time series figure"""
+    trade_volume = df_trades.groupby('timestep').agg({
+        'quantity': 'sum',
+        'action': lambda x: (x == 'buy').sum() - (x == 'sell').sum()  # net buy
+    }).reset_index()
+    trade_volume.columns = ['timestep', 'total_volume', 'net_buy']
+    
+    fig_volume = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=('Total Trading Volume', 'Net Buy Volume'),
+        vertical_spacing=0.1
+    )
+    
+    fig_volume.add_traces(
+        [
+            go.Bar(x=trade_volume['timestep'], y=trade_volume['total_volume'], name='Total Trading Volume'),
+            go.Bar(
+                x=trade_volume['timestep'],
+                y=trade_volume['net_buy'],
+                name='Net Buy Volume',
+                marker_color=np.where(trade_volume['net_buy'] > 0, 'green', 'red')
+            )
+        ],
+        rows=[1, 2], cols=[1, 1]
+    )
+    
+    fig_volume.update_xaxes(title_text="Time Step", row=2, col=1)
+    fig_volume.update_yaxes(title_text="Trading Volume", row=1, col=1)
+    fig_volume.update_yaxes(title_text="Net Buy Volume", row=2, col=1)
+    fig_volume.update_layout(height=600, showlegend=False)
+    
+    return fig_volume
+
 def show_trading_analysis():
     """show trading analysis"""
     sim = get_simulator()
@@ -273,25 +390,11 @@ def show_trading_analysis():
         return
     
     # collect all trades
-    all_trades = []
-    for h in history:
-        trades = h.get('trades', [])
-        for trade in trades:
-            all_trades.append({
-                'timestep': h['timestep'],
-                'agent_name': trade.get('agent_name', ''),
-                'agent_type': trade.get('agent_type', ''),
-                'action': trade.get('action', ''),
-                'quantity': trade.get('quantity', 0),
-                'price': trade.get('price', 0)
-            })
-    
-    if not all_trades:
+    df_trades = get_trades_df()
+    if df_trades.empty:
         st.info("No trading record")
         return
     
-    df_trades = pd.DataFrame(all_trades)
-    
     # trading volume statistics
     col1, col2 = st.columns(2)
     
@@ -320,38 +423,7 @@ def show_trading_analysis():
     
     # trading time series
     st.subheader("Trading Volume Time Series")
-    trade_volume = df_trades.groupby('timestep').agg({
-        'quantity': 'sum',
-        'action': lambda x: (x == 'buy').sum() - (x == 'sell').sum()  # net buy
-    }).reset_index()
-    trade_volume.columns = ['timestep', 'total_volume', 'net_buy']
-    
-    fig_volume = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=('Total Trading Volume', 'Net Buy Volume'),
-        vertical_spacing=0.1
-    )
-    
-    fig_volume.add_trace(
-        go.Bar(x=trade_volume['timestep'], y=trade_volume['total_volume'], name='Total Trading Volume'),
-        row=1, col=1
-    )
-    
-    fig_volume.add_trace(
-        go.Bar(
-            x=trade_volume['timestep'], 
-            y=trade_volume['net_buy'],
-            name='Net Buy Volume',
-            marker_color=['green' if x > 0 else 'red' for x in trade_volume['net_buy']]
-        ),
-        row=2, col=1
-    )
-    
-    fig_volume.update_xaxes(title_text="Time Step", row=2, col=1)
-    fig_volume.update_yaxes(title_text="Trading Volume", row=1, col=1)
-    fig_volume.update_yaxes(title_text="Net Buy Volume", row=2, col=1)
-    fig_volume.update_layout(height=600, showlegend=False)
-    
+    fig_volume = get_step_cached('volume_fig', lambda: build_volume_figure(df_trades))
     st.plotly_chart(fig_volume)
     
     # trading detail table
@@ -365,15 +437,11 @@ def show_agent_states():
         st.info("No data")
         return
     
-    latest_step = sim.simulation_history[-1]
-    agent_states = latest_step.get('agent_states', [])
-    
-    if not agent_states:
+    df_agents = get_agents_df()
+    if df_agents.empty:
         st.info("No agent states data")
         return
     
-    df_agents = pd.DataFrame(agent_states)
-    
     # agent states table
     st.subheader("Agent Current States")
     st.dataframe(df_agents)
@@ -10,12 +10,15 @@ BAIDU_API_KEY = "bce-v3/ALTAK-sqxDsBHgj2ifI2OrfTq2X/e4fd6c8dec76c9a8b13e98f8e279
 # API Key format: bce-v3/{access_key}/{secret_key}
 def parse_api_key(api_key: str):
     """Parse API Key"""
-    parts = api_key.split('/')
-    if len(parts) >= 3:
-        access_key = parts[1]
-        secret_key = parts[2]
-        return access_key, secret_key
-    return None, None
+    # locate the separators instead of splitting the whole key
+    first = api_key.find('/')
+    second = api_key.find('/', first + 1) if first >= 0 else -1
+    if second < 0:
+        return None, None
+    end = api_key.find('/', second + 1)
+    access_key = api_key[first + 1:second]
+    secret_key = api_key[second + 1:end] if end >= 0 else api_key[second + 1:]
+    return access_key, secret_key
 
 ACCESS_KEY, SECRET_KEY = parse_api_key(BAIDU_API_KEY)
 
@@ -31,4 +34,16 @@ AGENT_NAMES = {
     'pessimistic': ['pessimistic investor A', 'pessimistic investor B'],
     'calm': ['calm investor A']
 }
+AGENT_MEMORY_SIZE = 256  # number of latest opinions and intentions kept per agent
 
+# LLM request configuration
+LLM_MAX_CONCURRENCY = 10  # concurrent API calls (matches the default HTTP connection pool size of requests)
+
+# LLM cache configuration
+LLM_CACHE_CAPACITY = 10000  # maximum number of exact-match cached responses
+LLM_CACHE_TTL = 600.0  # seconds before an exact-match cached response expires
+SEMANTIC_CACHE_ENABLED = False  # match belief news texts by meaning (needs sentence-transformers, model loaded on first lookup)
+SEMANTIC_CACHE_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+SEMANTIC_CACHE_THRESHOLD = 0.87  # minimum cosine similarity for a cache hit
+SEMANTIC_CACHE_CAPACITY = 1024  # maximum number of cached responses
+SEMANTIC_CACHE_TTL = 600.0  # seconds before a cached response expires
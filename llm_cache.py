@@ -0,0 +1,184 @@
+"""
+LLM Cache: Reuses LLM responses for repeated agent prompts
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+
+# sentence-transformers pulls in torch, so it is imported when the semantic cache is first used
+SENTENCE_TRANSFORMERS_AVAILABLE = None  # unknown until the first import attempt
+
+
+def _import_sentence_transformers():
+    """import SentenceTransformer on first use, returns the class or None if it is not installed"""
+    global SENTENCE_TRANSFORMERS_AVAILABLE
+    try:
+        from sentence_transformers import SentenceTransformer
+        SENTENCE_TRANSFORMERS_AVAILABLE = True
+        return SentenceTransformer
+    except ImportError:
+        SENTENCE_TRANSFORMERS_AVAILABLE = False
+        return None
+
+
+class LLMCache:
+    """Exact-match cache: returns a stored response when the same request is sent again"""
+
+    def __init__(self, capacity: int = 10000, ttl: float = 600.0):
+        """
+        Initialize cache
+
+        Args:
+            capacity: maximum number of cached responses (least recently used is evicted)
+            ttl: time to live of each entry in seconds
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (response, expires_at), in LRU order
+
+    @staticmethod
+    def cache_key(model: str, messages: List[Dict], temperature: float) -> str:
+        """canonical key of a request"""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up the response of a request
+
+        Returns:
+            str: cached response, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        response, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: str):
+        """store the response of a request"""
+        self._entries[key] = (response, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Semantic cache: returns a stored response when a new text is close in meaning to a cached one
+
+    Entries are grouped by an exact namespace (e.g. prompt kind, agent type, temperature and numeric state),
+    only texts within the same namespace are compared
+    """
+
+    def __init__(self, model_name: str, threshold: float = 0.87, capacity: int = 1024, ttl: float = 600.0):
+        """
+        Initialize cache (the embedding model is loaded on first use)
+
+        Args:
+            model_name: sentence-transformers embedding model
+            threshold: minimum cosine similarity for a cache hit
+            capacity: maximum number of cached responses (least recently used is evicted)
+            ttl: time to live of each entry in seconds
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.encoder = None
+        self._load_attempted = False
+
+    def _load_encoder(self) -> bool:
+        """load the embedding model on first use, returns whether it is available"""
+        if self._load_attempted:
+            return self.encoder is not None
+        self._load_attempted = True
+
+        sentence_transformer = _import_sentence_transformers()
+        if sentence_transformer is None:
+            print("Hint: semantic cache disabled (sentence-transformers package not installed)")
+            return False
+        try:
+            self.encoder = sentence_transformer(self.model_name)
+        except Exception as e:
+            print(f"Warning: embedding model loading failed: {e}, semantic cache disabled")
+            return False
+
+        # normalized embeddings, one row per slot, so a lookup is a single matrix-vector product
+        dim = self.encoder.get_sentence_embedding_dimension()
+        self._embeddings = np.zeros((self.capacity, dim), dtype=np.float32)
+        # namespace id of each slot (non-negative, see _namespace_id), -1 if free
+        self._slot_namespace = np.full(self.capacity, -1, dtype=np.int64)
+        self._entries = OrderedDict()  # slot -> (response, expires_at), in LRU order
+        self._last_query = (None, None)  # (text, embedding) of the latest lookup
+        return True
+
+    @staticmethod
+    def _namespace_id(namespace: Hashable) -> int:
+        """non-negative id of a namespace, so it never collides with the free-slot marker -1"""
+        return hash(namespace) & 0x7FFFFFFFFFFFFFFF
+
+    def _embed(self, text: str) -> np.ndarray:
+        """embed text, reusing the embedding of the latest lookup"""
+        if self._last_query[0] == text:
+            return self._last_query[1]
+        embedding = np.asarray(self.encoder.encode(text, normalize_embeddings=True), dtype=np.float32)
+        self._last_query = (text, embedding)
+        return embedding
+
+    def _evict(self, slot: int):
+        """remove a slot from the cache"""
+        self._slot_namespace[slot] = -1
+        del self._entries[slot]
+
+    def get(self, namespace: Hashable, text: str) -> Optional[str]:
+        """
+        Look up a response for a semantically similar text in the same namespace
+
+        Returns:
+            str: cached response, or None on a miss
+        """
+        if not self._load_encoder():
+            return None
+        in_namespace = self._slot_namespace == self._namespace_id(namespace)
+        if not in_namespace.any():
+            return None
+
+        scores = self._embeddings @ self._embed(text)
+        scores[~in_namespace] = -1.0
+        slot = int(np.argmax(scores))
+        if scores[slot] < self.threshold:
+            return None
+
+        response, expires_at = self._entries[slot]
+        if expires_at < time.monotonic():
+            self._evict(slot)
+            return None
+        self._entries.move_to_end(slot)
+        return response
+
+    def put(self, namespace: Hashable, text: str, response: str):
+        """store the response of a text in a namespace"""
+        if not self._load_encoder():
+            return
+
+        if len(self._entries) >= self.capacity:
+            slot, _ = self._entries.popitem(last=False)
+        else:
+            slot = int(np.flatnonzero(self._slot_namespace == -1)[0])
+
+        self._embeddings[slot] = self._embed(text)
+        self._slot_namespace[slot] = self._namespace_id(namespace)
+        self._entries[slot] = (response, time.monotonic() + self.ttl)
@@ -1,54 +1,156 @@
 """
 LLM Client: Integrates Baidu Wenxin API
 """
+import asyncio
+import functools
 import os
-try:
-    import qianfan
-    QIANFAN_AVAILABLE = True
-except ImportError:
-    QIANFAN_AVAILABLE = False
-    print("Warning: qianfan package not installed, using mock response. To use real API, run: pip install qianfan")
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
 
-from config import ACCESS_KEY, SECRET_KEY
+from config import (
+    ACCESS_KEY, SECRET_KEY, LLM_MAX_CONCURRENCY, LLM_CACHE_CAPACITY, LLM_CACHE_TTL,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MODEL, SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_CAPACITY, SEMANTIC_CACHE_TTL
+)
+from llm_cache import LLMCache, SemanticCache
+
+MODEL_NAME = "ERNIE-Bot-turbo"
+
+# prompt keywords of the mock responses (the longer phrase first, so it wins over 'action:')
+_MOCK_POSITIVE_KEYWORDS = frozenset(("买入", "乐观", "optimistic"))
+_MOCK_NEGATIVE_KEYWORDS = frozenset(("卖出", "悲观", "pessimistic"))
+_MOCK_KEYWORD_RE = re.compile(
+    "decide your investment action|action:|" + "|".join(sorted(_MOCK_POSITIVE_KEYWORDS | _MOCK_NEGATIVE_KEYWORDS))
+)
+
+# mock intention responses of each agent type (has_shares: whether the agent holds shares it could sell)
+def _mock_optimistic(has_shares: bool) -> str:
+    """Optimistic investors are more likely to buy"""
+    if random.random() < 0.7:  # 70% chance to buy
+        return "action: buy\nquantity: 50\nreason: I am optimistic about the market and believe the price will rise."
+    else:
+        return "action: hold\nquantity: 0\nreason: I will wait for a better entry point."
+
+def _mock_pessimistic(has_shares: bool) -> str:
+    """Pessimistic investors are more likely to sell or hold"""
+    if not has_shares:
+        # No shares to sell, so hold
+        return "action: hold\nquantity: 0\nreason: I am cautious about the market but have no shares to sell."
+    elif random.random() < 0.6:  # 60% chance to sell if has shares
+        return "action: sell\nquantity: 30\nreason: I am pessimistic about the market and want to reduce risk."
+    else:
+        return "action: hold\nquantity: 0\nreason: I will wait and see."
+
+def _mock_calm(has_shares: bool) -> str:
+    """Calm investors make balanced decisions"""
+    if random.random() < 0.5:
+        return "action: buy\nquantity: 30\nreason: Based on analysis, this seems like a reasonable entry point."
+    elif has_shares and random.random() < 0.3:
+        return "action: sell\nquantity: 20\nreason: Taking some profits based on current valuation."
+    else:
+        return "action: hold\nquantity: 0\nreason: Waiting for more clarity before making a decision."
+
+MOCK_INTENTION_FNS = {
+    'optimistic': _mock_optimistic,
+    'pessimistic': _mock_pessimistic,
+    'calm': _mock_calm
+}
+
+# environment settings, read once at import
+# (mock mode avoids network/timeout blocking; environment keys take precedence over the configuration file)
+_USE_MOCK = os.getenv("USE_MOCK_LLM", "0") == "1"
+_AK = os.getenv('QIANFAN_ACCESS_KEY', ACCESS_KEY)
+_SK = os.getenv('QIANFAN_SECRET_KEY', SECRET_KEY)
+
+# qianfan is imported on first real API use, so mock mode does not pay its import time
+QIANFAN_AVAILABLE = None  # None until the import has been attempted
+
+def _import_qianfan():
+    """import qianfan on first use, returns the module or None if it is not installed"""
+    global QIANFAN_AVAILABLE
+    try:
+        import qianfan
+        QIANFAN_AVAILABLE = True
+        return qianfan
+    except ImportError:
+        QIANFAN_AVAILABLE = False
+        print("Warning: qianfan package not installed, using mock response. To use real API, run: pip install qianfan")
+        return None
 
 class LLMClient:
     """Baidu Wenxin LLM Client"""
     
+    _instance = None  # shared client returned by get()
+    _chat_comp = None  # ChatCompletion shared by all clients (initialized once)
+    
+    @classmethod
+    def get(cls) -> 'LLMClient':
+        """get the shared client, creating it on first use"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
     def __init__(self):
         """Initialize client"""
-        # Allow using mock mode through environment variables to avoid network/timeout blocking
-        self.force_mock = os.getenv("USE_MOCK_LLM", "0") == "1"
-
-        # Use environment variables first, then use configuration file
-        ak = os.getenv('QIANFAN_ACCESS_KEY', ACCESS_KEY)
-        sk = os.getenv('QIANFAN_SECRET_KEY', SECRET_KEY)
-        
-        if not self.force_mock and QIANFAN_AVAILABLE and ak and sk:
-            try:
-                self.chat_comp = qianfan.ChatCompletion(
-                    ak=ak,
-                    sk=sk
-                )
-                print("✓ Baidu Wenxin API initialized")
-            except Exception as e:
-                print(f"Warning: API initialization failed: {e}, using mock response")
-                self.chat_comp = None
+        self.force_mock = _USE_MOCK
+        ak, sk = _AK, _SK
+        
+        qianfan = None
+        if not self.force_mock and ak and sk and QIANFAN_AVAILABLE is not False:
+            qianfan = _import_qianfan()
+        
+        if qianfan is not None:
+            if LLMClient._chat_comp is None:
+                try:
+                    LLMClient._chat_comp = qianfan.ChatCompletion(
+                        ak=ak,
+                        sk=sk
+                    )
+                    print("✓ Baidu Wenxin API initialized")
+                except Exception as e:
+                    print(f"Warning: API initialization failed: {e}, using mock response")
+            self.chat_comp = LLMClient._chat_comp
         else:
             self.chat_comp = None
             if self.force_mock:
                 print("Hint: USE_MOCK_LLM=1 is enabled, using mock response mode")
-            elif not QIANFAN_AVAILABLE:
-                print("Hint: using mock response mode (qianfan package not installed)")
             elif not (ak and sk):
                 print("Warning: API key not correctly configured, using mock response")
+            else:
+                print("Hint: using mock response mode (qianfan package not installed)")
+
+        # worker threads for concurrent API calls: they share the keep-alive HTTP connection pool
+        # of the single ChatCompletion instance, so TCP/TLS handshakes are paid once per connection
+        self.executor = None
+        if self.chat_comp is not None:
+            self.executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY)
+        
+        # response caches (only consulted for real API calls; the embedding model is loaded on first lookup)
+        self.cache = LLMCache(capacity=LLM_CACHE_CAPACITY, ttl=LLM_CACHE_TTL)
+        self.semantic_cache = None
+        if self.chat_comp is not None and SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                SEMANTIC_CACHE_MODEL,
+                threshold=SEMANTIC_CACHE_THRESHOLD,
+                capacity=SEMANTIC_CACHE_CAPACITY,
+                ttl=SEMANTIC_CACHE_TTL
+            )
+    
+    @property
+    def is_mock(self) -> bool:
+        """whether responses are mocked (mock mode enabled or API not available)"""
+        return self.force_mock or self.chat_comp is None
     
-    def generate_response(self, messages, temperature=0.7):
+    def generate_response(self, messages, temperature=0.7, semantic_key=None):
         """
         Generate LLM response
         
         Args:
             messages: message list, format: [{"role": "user", "content": "..."}]
             temperature: temperature parameter, controls randomness
+            semantic_key: (namespace, text) for the semantic cache, or None to use only the exact-match cache;
+                the namespace holds every exact part of the prompt, text the free-text part compared by meaning
         
         Returns:
             str: LLM generated response text
@@ -57,65 +159,157 @@ class LLMClient:
             # mock response (for testing)
             return self._mock_response(messages)
         
+        key, semantic_key, cached = self._lookup_cache(messages, temperature, semantic_key)
+        if cached is not None:
+            return cached
+        
         try:
             # call Baidu Wenxin API
             response = self.chat_comp.do(
-                model="ERNIE-Bot-turbo",
+                model=MODEL_NAME,
                 messages=messages,
                 temperature=temperature,
                 timeout=8  # set timeout to prevent blocking
             )
-            # handle response format
-            if isinstance(response, dict):
-                return response.get('result', '')
-            elif isinstance(response, str):
-                return response
-            else:
-                return str(response)
         except Exception as e:
             print(f"LLM API call error: {e}, using mock response")
             return self._mock_response(messages)
+        
+        return self._store_response(key, semantic_key, response)
+    
+    async def agenerate_response(self, messages, temperature=0.7, semantic_key=None):
+        """
+        Generate LLM response without blocking the event loop, so that several agents can wait on the API concurrently
+        
+        Args:
+            messages: message list, format: [{"role": "user", "content": "..."}]
+            temperature: temperature parameter, controls randomness
+            semantic_key: (namespace, text) for the semantic cache, see generate_response
+        
+        Returns:
+            str: LLM generated response text
+        """
+        if self.force_mock or self.chat_comp is None:
+            # mock response (for testing)
+            return self._mock_response(messages)
+        
+        key, semantic_key, cached = self._lookup_cache(messages, temperature, semantic_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            # call Baidu Wenxin API on a worker thread (ChatCompletion.ado would open a new connection per call)
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                functools.partial(
+                    self.chat_comp.do,
+                    model=MODEL_NAME,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=8  # set timeout to prevent blocking
+                )
+            )
+        except Exception as e:
+            print(f"LLM API call error: {e}, using mock response")
+            return self._mock_response(messages)
+        
+        return self._store_response(key, semantic_key, response)
+    
+    def generate_batch(self, messages_list, temperature=0.7, semantic_keys=None):
+        """
+        Generate LLM responses for several independent prompts in one call
+        
+        Args:
+            messages_list: list of message lists, one per prompt
+            temperature: temperature parameter, controls randomness
+            semantic_keys: semantic cache key of each prompt (see generate_response), or None
+        
+        Returns:
+            List[str]: LLM generated response texts, in the order of messages_list
+        """
+        return asyncio.run(self.agenerate_batch(messages_list, temperature, semantic_keys))
+    
+    async def agenerate_batch(self, messages_list, temperature=0.7, semantic_keys=None):
+        """
+        async version of generate_batch: all prompts are in flight at once, so the batch costs about one round-trip
+        (identical prompts, e.g. of agents of one type in the same state, are sent once and share the response)
+        """
+        if self.is_mock:
+            return [self._mock_response(messages) for messages in messages_list]
+        
+        if semantic_keys is None:
+            semantic_keys = [None] * len(messages_list)
+        keys = [LLMCache.cache_key(MODEL_NAME, messages, temperature) for messages in messages_list]
+        unique = dict(zip(keys, zip(messages_list, semantic_keys)))
+        responses = await asyncio.gather(*[
+            self.agenerate_response(messages, temperature, semantic_key)
+            for messages, semantic_key in unique.values()
+        ])
+        response_of = dict(zip(unique, responses))
+        return [response_of[key] for key in keys]
+    
+    def _lookup_cache(self, messages, temperature, semantic_key=None):
+        """
+        Look up a cached response
+        
+        Returns:
+            tuple: (exact-match key, semantic cache (namespace, text) or None, cached response or None)
+        """
+        # reuse the response of an identical request, then of a semantically similar text in the same namespace
+        key = LLMCache.cache_key(MODEL_NAME, messages, temperature)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return key, None, cached
+        if self.semantic_cache is None or semantic_key is None:
+            return key, None, None
+        namespace, text = semantic_key
+        semantic_key = ((MODEL_NAME, temperature, namespace), text)
+        cached = self.semantic_cache.get(*semantic_key)
+        if cached is not None:
+            self.cache.put(key, cached)
+        return key, semantic_key, cached
+    
+    def _store_response(self, key, semantic_key, response):
+        """extract response text and store it in the caches"""
+        # handle response format
+        if isinstance(response, dict):
+            result = response.get('result', '')
+        elif isinstance(response, str):
+            result = response
+        else:
+            result = str(response)
+        
+        if result:
+            self.cache.put(key, result)
+            if semantic_key is not None:
+                self.semantic_cache.put(*semantic_key, result)
+        return result
     
     def _mock_response(self, messages):
         """mock response (when API is not available)"""
-        import random
         last_message = messages[-1]['content'] if messages else ""
+        # classify the prompt with one lowercase scan
+        hits = set(_MOCK_KEYWORD_RE.findall(last_message.lower()))
         
         # For intention formation prompts, return formatted response
-        if "action:" in last_message.lower() or "decide your investment action" in last_message.lower():
-            # Extract agent type and market outlook from prompt
-            if "optimistic" in last_message.lower():
-                # Optimistic investors are more likely to buy
-                if random.random() < 0.7:  # 70% chance to buy
-                    return "action: buy\nquantity: 50\nreason: I am optimistic about the market and believe the price will rise."
-                else:
-                    return "action: hold\nquantity: 0\nreason: I will wait for a better entry point."
-            elif "pessimistic" in last_message.lower():
-                # Pessimistic investors are more likely to sell or hold
-                if "shares: 0" in last_message or "shares:0" in last_message:
-                    # No shares to sell, so hold
-                    return "action: hold\nquantity: 0\nreason: I am cautious about the market but have no shares to sell."
-                elif random.random() < 0.6:  # 60% chance to sell if has shares
-                    return "action: sell\nquantity: 30\nreason: I am pessimistic about the market and want to reduce risk."
-                else:
-                    return "action: hold\nquantity: 0\nreason: I will wait and see."
+        if "action:" in hits or "decide your investment action" in hits:
+            has_shares = "shares: 0" not in last_message and "shares:0" not in last_message
+            # Extract agent type from prompt
+            if "optimistic" in hits:
+                return _mock_optimistic(has_shares)
+            elif "pessimistic" in hits:
+                return _mock_pessimistic(has_shares)
             else:  # calm investor
-                # Calm investors make balanced decisions
-                if random.random() < 0.5:
-                    return "action: buy\nquantity: 30\nreason: Based on analysis, this seems like a reasonable entry point."
-                elif "shares: 0" not in last_message and "shares:0" not in last_message and random.random() < 0.3:
-                    return "action: sell\nquantity: 20\nreason: Taking some profits based on current valuation."
-                else:
-                    return "action: hold\nquantity: 0\nreason: Waiting for more clarity before making a decision."
+                return _mock_calm(has_shares)
         
         # For belief update prompts
-        if "买入" in last_message or "乐观" in last_message or "optimistic" in last_message.lower():
+        if hits & _MOCK_POSITIVE_KEYWORDS:
             return "Based on current information, I think this is a good time to buy. The market outlook is positive."
-        elif "卖出" in last_message or "悲观" in last_message or "pessimistic" in last_message.lower():
+        elif hits & _MOCK_NEGATIVE_KEYWORDS:
             return "Based on current information, I think you should be cautious and consider selling. The market outlook is negative."
         else:
             return "I need more information to make a decision. The market outlook is neutral."
 
 # global LLM client instance
-llm_client = LLMClient()
+llm_client = LLMClient.get()
 
@@ -2,31 +2,95 @@
 Market Simulation Engine: Manages stocks, news, and price calculations
 """
 import random
+from collections import deque
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        """stand-in for numba.njit when numba is not installed (the function runs as plain Python)"""
+        return lambda func: func
+
+RANDOM_BUFFER_SIZE = 10000  # random draws generated at once (refilled when used up)
+HISTORY_CAPACITY = 1024  # initial capacity of the history arrays (doubled when full)
+
+# news sentiment codes (SENTIMENT_LABELS gives the display form)
+POS, NEG, NEU = 1, -1, 0
+SENTIMENT_LABELS = {POS: 'positive', NEG: 'negative', NEU: 'neutral'}
+_NEWS_IMPACT_SCORES = {POS: 0.7, NEG: -0.7, NEU: 0.0}  # impact score of each sentiment code
+
+@njit(cache=True)
+def _price_step(current_price: float, net_order_flow: float, news_impact: float, floor_price: float, noise: float) -> float:
+    """price after one step (JIT-compiled when numba is available)"""
+    # base random walk
+    random_walk = noise * current_price
+    
+    # order flow impact (buy more涨，sell more跌）
+    order_impact = net_order_flow * 0.1  # order flow impact coefficient
+    
+    # news impact
+    news_impact_value = news_impact * current_price * 0.05
+    
+    # price adjustment
+    price_change = random_walk + order_impact + news_impact_value
+    
+    # update price
+    new_price = current_price + price_change
+    
+    # prevent price from being too low
+    return new_price if new_price > floor_price else floor_price
+
 class Market:
     """Market class: Manages stocks and market environment"""
     
-    def __init__(self, initial_price: float = 100.0):
+    def __init__(self, initial_price: float = 100.0, history_capacity: Optional[int] = None):
         """
         Initialize market
         
         Args:
             initial_price: initial stock price
+            history_capacity: number of latest steps kept in the news, trades and sentiment records
+                (None keeps all steps; the price history is always complete)
         """
         self.initial_price = initial_price
+        self.history_capacity = history_capacity
         self.current_price = initial_price
-        self.price_history = [initial_price]
-        self.news_history = []
-        self.trades_history = []
-        self.sentiment_history = []
+        # price history: preallocated array, the first _ph_len entries are used
+        self._prices = np.empty(HISTORY_CAPACITY, dtype=np.float64)
+        self._prices[0] = initial_price
+        self._ph_len = 1
+        # news history as parallel columns (a ring of the latest news if history_capacity is set,
+        # news_history returns them in chronological order)
+        self.news_sentiment = np.empty(history_capacity or HISTORY_CAPACITY, dtype=np.int8)  # POS/NEG/NEU
+        self.news_timestamp = np.empty(history_capacity or HISTORY_CAPACITY, dtype=np.int32)
+        self.news_content = [None] * history_capacity if history_capacity is not None else []
+        self.news_count = 0  # news generated so far
+        self.trades_history = self._new_records()
+        self.sentiment_history = self._new_records()
         self.timestep = 0
         self.base_value = initial_price  # base value
         
+        # running price statistics, updated with every new price
+        self._min = self._max = initial_price
+        self._ret_sum = self._ret_sumsq = 0.0  # sum and sum of squares of returns
+        self._ret_n = 0
+        
+        # pre-generated random draws, consumed one per step
+        self._noise_buf = np.random.normal(0, 0.01, size=RANDOM_BUFFER_SIZE)  # random walk noise
+        self._noise_idx = 0
+        self._sentiment_buf = self._draw_sentiments()  # news sentiment indices
+        self._sentiment_idx = 0
+        self._template_buf = np.random.random(RANDOM_BUFFER_SIZE)  # news template selection
+        self._template_idx = 0
+        
         # news templates
-        self.positive_news_templates = [
+        self.positive_news_templates = (
             "The company released better-than-expected financial results, with net profit rising 30% year-on-year.",
             "The company has been granted a significant patent, further expanding its technological edge.",
             "The company has entered into a strategic cooperation agreement with an industry leader.",
@@ -35,9 +99,9 @@ class Market:
             "The company announced a large-scale share repurchase plan, demonstrating management confidence",
             "With favorable industry policies, the company is expected to benefit.",
             "The company's overseas business expansion has been smooth and its market share has increased."
-        ]
+        )
         
-        self.negative_news_templates = [
+        self.negative_news_templates = (
             "The company's financial report fell short of expectations, with net profit dropping by 20% year-on-year.",
             "The company is facing a major lawsuit, which may result in significant compensation claims.",
             "The company's main customers have lost interest and the order volume has decreased significantly.",
@@ -46,37 +110,36 @@ class Market:
             "The company's product has quality issues and is facing a recall risk.",
             "Analysts downgraded the company's rating and significantly lowered the target price.",
             "The company's cash flow is tight and the debt repayment pressure is increasing."
-        ]
+        )
         
-        self.neutral_news_templates = [
+        self.neutral_news_templates = (
             "The company released a routine announcement, with no major changes.",
             "The overall market is volatile, and the company's stock price follows the adjustment.",
             "The company participated in the industry conference and shared development experience.",
             "The company completed routine business adjustments and is operating normally."
-        ]
+        )
     
     def generate_news(self) -> Dict:
         """
         Generate random news
         
         Returns:
-            Dict: {'content': str, 'sentiment': 'positive'/'negative'/'neutral', 'timestamp': int}
+            Dict: {'content': str, 'sentiment': POS/NEG/NEU, 'timestamp': int}
         """
         # randomly select news type (70% probability of news, 30% probability of no news)
         if random.random() < 0.7:
-            sentiment_weights = [0.4, 0.4, 0.2]  # positive, negative, neutral weights
-            sentiment_idx = np.random.choice([0, 1, 2], p=sentiment_weights)
-            sentiments = ['positive', 'negative', 'neutral']
+            sentiment_idx = self._next_sentiment_idx()
+            sentiments = (POS, NEG, NEU)
             sentiment = sentiments[sentiment_idx]
             
-            if sentiment == 'positive':
-                content = random.choice(self.positive_news_templates)
-            elif sentiment == 'negative':
-                content = random.choice(self.negative_news_templates)
-            else:
-                content = random.choice(self.neutral_news_templates)
+            templates = (
+                self.positive_news_templates,
+                self.negative_news_templates,
+                self.neutral_news_templates
+            )[sentiment_idx]
+            content = templates[self._next_template_idx(len(templates))]
         else:
-            sentiment = 'neutral'
+            sentiment = NEU
             content = "Today's market is calm, no major news"
         
         news = {
@@ -85,9 +148,89 @@ class Market:
             'timestamp': self.timestep
         }
         
-        self.news_history.append(news)
+        # record news
+        i = self.news_count
+        if self.history_capacity is not None:
+            i %= self.history_capacity
+            self.news_content[i] = content
+        else:
+            if i == len(self.news_timestamp):
+                self.news_sentiment = self._grow(self.news_sentiment)
+                self.news_timestamp = self._grow(self.news_timestamp)
+            self.news_content.append(content)
+        self.news_sentiment[i] = sentiment
+        self.news_timestamp[i] = self.timestep
+        self.news_count += 1
         return news
     
+    @property
+    def news_history(self) -> Dict:
+        """recorded news columns {'sentiment', 'timestamp', 'content'} in chronological order"""
+        n = self.news_count
+        if self.history_capacity is None or n <= self.history_capacity:
+            return {
+                'sentiment': self.news_sentiment[:n],
+                'timestamp': self.news_timestamp[:n],
+                'content': self.news_content[:n]
+            }
+        # full ring: the oldest news is at the next write position
+        start = n % self.history_capacity
+        return {
+            'sentiment': np.roll(self.news_sentiment, -start),
+            'timestamp': np.roll(self.news_timestamp, -start),
+            'content': self.news_content[start:] + self.news_content[:start]
+        }
+    
+    @property
+    def price_history(self) -> np.ndarray:
+        """recorded prices (a view of the used part of the price array)"""
+        return self._prices[:self._ph_len]
+    
+    def _new_records(self):
+        """empty per-step record list, bounded if history_capacity is set"""
+        if self.history_capacity is None:
+            return []
+        return deque(maxlen=self.history_capacity)
+    
+    @staticmethod
+    def _grow(array: np.ndarray) -> np.ndarray:
+        """copy array into one of double capacity"""
+        new = np.empty(2 * len(array), dtype=array.dtype)
+        new[:len(array)] = array
+        return new
+    
+    def _draw_sentiments(self) -> np.ndarray:
+        """draw a buffer of news sentiment indices"""
+        sentiment_weights = [0.4, 0.4, 0.2]  # positive, negative, neutral weights
+        return np.random.choice([0, 1, 2], size=RANDOM_BUFFER_SIZE, p=sentiment_weights)
+    
+    def _next_sentiment_idx(self) -> int:
+        """next news sentiment index (0 positive, 1 negative, 2 neutral)"""
+        if self._sentiment_idx >= len(self._sentiment_buf):
+            self._sentiment_buf = self._draw_sentiments()
+            self._sentiment_idx = 0
+        sentiment_idx = self._sentiment_buf[self._sentiment_idx]
+        self._sentiment_idx += 1
+        return sentiment_idx
+    
+    def _next_template_idx(self, num_templates: int) -> int:
+        """uniformly random index of the next news template"""
+        if self._template_idx >= len(self._template_buf):
+            self._template_buf = np.random.random(RANDOM_BUFFER_SIZE)
+            self._template_idx = 0
+        template_idx = int(self._template_buf[self._template_idx] * num_templates)
+        self._template_idx += 1
+        return template_idx
+    
+    def _next_noise(self) -> float:
+        """next random walk noise sample"""
+        if self._noise_idx >= len(self._noise_buf):
+            self._noise_buf = np.random.normal(0, 0.01, size=RANDOM_BUFFER_SIZE)
+            self._noise_idx = 0
+        noise = float(self._noise_buf[self._noise_idx])
+        self._noise_idx += 1
+        return noise
+    
     def calculate_price(self, net_order_flow: float, news_impact: float = 0.0) -> float:
         """
         Calculate new stock price (based on supply and demand model)
@@ -99,26 +242,23 @@ class Market:
         Returns:
             float: new stock price
         """
-        # base random walk
-        random_walk = np.random.normal(0, 0.01) * self.current_price
+        new_price = _price_step(
+            self.current_price, net_order_flow, news_impact, self.initial_price * 0.3, self._next_noise()
+        )
         
-        # order flow impact (buy more涨，sell more跌）
-        order_impact = net_order_flow * 0.1  # order flow impact coefficient
-        
-        # news impact
-        news_impact_value = news_impact * self.current_price * 0.05
-        
-        # price adjustment
-        price_change = random_walk + order_impact + news_impact_value
-        
-        # update price
-        new_price = self.current_price + price_change
-        
-        # prevent price from being too low
-        new_price = max(new_price, self.initial_price * 0.3)
+        # update running statistics
+        ret = (new_price - self.current_price) / self.current_price
+        self._ret_sum += ret
+        self._ret_sumsq += ret * ret
+        self._ret_n += 1
+        self._min = min(self._min, new_price)
+        self._max = max(self._max, new_price)
         
         self.current_price = new_price
-        self.price_history.append(new_price)
+        if self._ph_len == len(self._prices):
+            self._prices = self._grow(self._prices)
+        self._prices[self._ph_len] = new_price
+        self._ph_len += 1
         return new_price
     
     def get_news_impact_score(self, news: Dict) -> float:
@@ -128,28 +268,28 @@ class Market:
         Returns:
             float: score between -1 and 1, -1 most negative, 1 most positive
         """
-        sentiment_scores = {
-            'positive': 0.7,
-            'negative': -0.7,
-            'neutral': 0.0
-        }
-        return sentiment_scores.get(news['sentiment'], 0.0)
+        return _NEWS_IMPACT_SCORES.get(news['sentiment'], 0.0)  # unknown sentiment has no impact
     
-    def update(self, trades: List[Dict], news: Dict):
+    def update(self, trades: List[Dict], news: Dict, signed_quantities: Optional[np.ndarray] = None):
         """
         Update market state
         
         Args:
             trades: trade list
             news: news information
+            signed_quantities: quantity of each trade, positive for buy and negative for sell
+                (computed from trades if not given)
         """
         # calculate net order flow
-        net_order_flow = 0
-        for trade in trades:
-            if trade['action'] == 'buy':
-                net_order_flow += trade['quantity']
-            elif trade['action'] == 'sell':
-                net_order_flow -= trade['quantity']
+        if signed_quantities is not None:
+            net_order_flow = int(signed_quantities.sum())
+        else:
+            net_order_flow = 0
+            for trade in trades:
+                if trade['action'] == 'buy':
+                    net_order_flow += trade['quantity']
+                elif trade['action'] == 'sell':
+                    net_order_flow -= trade['quantity']
         
         # calculate news impact
         news_impact = self.get_news_impact_score(news)
@@ -168,18 +308,19 @@ class Market:
     
     def get_market_statistics(self) -> Dict:
         """Get market statistics"""
-        if len(self.price_history) < 2:
+        if self._ret_n < 1:
             return {}
         
-        prices = np.array(self.price_history)
-        returns = np.diff(prices) / prices[:-1]
+        # volatility is the standard deviation of returns, from the running sums
+        ret_mean = self._ret_sum / self._ret_n
+        ret_var = max(self._ret_sumsq / self._ret_n - ret_mean * ret_mean, 0.0)
         
         return {
             'current_price': self.current_price,
             'price_change': self.current_price - self.initial_price,
             'price_change_pct': (self.current_price - self.initial_price) / self.initial_price * 100,
-            'volatility': np.std(returns) if len(returns) > 0 else 0,
-            'max_price': np.max(prices),
-            'min_price': np.min(prices)
+            'volatility': ret_var ** 0.5,
+            'max_price': self._max,
+            'min_price': self._min
         }
 
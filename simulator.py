@@ -1,25 +1,33 @@
 """
 Simulator Main Class: Coordinating Agents and Markets
 """
+import asyncio
+from collections import deque
 import numpy as np
-from typing import List, Dict
-from agent import Agent
+from typing import List, Dict, Optional
+from agent import Agent, BELIEF_TEMPERATURE, INTENTION_TEMPERATURE
 from market import Market
 from config import AGENT_TYPES, AGENT_NAMES
+from llm_client import llm_client
 
 class MarketSimulator:
     """Market simulator"""
     
-    def __init__(self, initial_price: float = 100.0):
+    def __init__(self, initial_price: float = 100.0, history_capacity: Optional[int] = None):
         """
         Initialize simulator
         
         Args:
             initial_price: initial stock price
+            history_capacity: number of latest steps kept in simulation_history and in the market's news,
+                trades and sentiment records (None keeps all steps); the price history and the agents'
+                trade buffers are compact numeric columns and always cover the whole run
         """
-        self.market = Market(initial_price)
+        self.history_capacity = history_capacity
+        self.market = Market(initial_price, history_capacity)
         self.agents: List[Agent] = []
-        self.simulation_history = []
+        self.simulation_history = self._new_history()
+        self._trade_count = 0  # trades of all steps, including those dropped from the history
         
         # create agents
         self._create_agents()
@@ -31,11 +39,40 @@ class MarketSimulator:
             for name in names:
                 agent = Agent(name, agent_type)
                 self.agents.append(agent)
+        
+        # agent indices of each type, for the market sentiment averages
+        self._agent_groups: Dict[str, np.ndarray] = {
+            agent_type: np.array([i for i, agent in enumerate(self.agents) if agent.agent_type == agent_type], dtype=np.intp)
+            for agent_type in ('optimistic', 'pessimistic', 'calm')
+        }
+        self._scores = np.zeros(len(self.agents))
+        self._trade_qsigned = np.empty(len(self.agents), dtype=np.int32)  # signed quantities of the step's trades
+        
+        # per-agent buffers of the agent state snapshot
+        self._names = [agent.name for agent in self.agents]
+        self._types = [agent.agent_type for agent in self.agents]
+        self._cash = np.empty(len(self.agents))
+        self._shares = np.empty(len(self.agents), dtype=np.int64)
+    
+    def _new_history(self):
+        """empty simulation history, bounded if history_capacity is set"""
+        if self.history_capacity is None:
+            return []
+        return deque(maxlen=self.history_capacity)
     
     def step(self) -> Dict:
         """
         Execute one step of simulation
         
+        Returns:
+            Dict: dictionary containing all information for this step
+        """
+        return asyncio.run(self.astep())
+    
+    async def astep(self) -> Dict:
+        """
+        Execute one step of simulation, querying the LLM for all agents concurrently
+        
         Returns:
             Dict: dictionary containing all information for this step
         """
@@ -45,33 +82,58 @@ class MarketSimulator:
         # 2. calculate current market sentiment
         market_sentiment = self._calculate_market_sentiment()
         
-        # 3. agents update beliefs
-        for agent in self.agents:
-            agent.update_beliefs(news, self.market.current_price, market_sentiment)
-        
-        # 4. agents form intentions
+        # 3. agents update beliefs (one batched LLM call for the agents whose situation changed)
+        pending = [
+            agent for agent in self.agents
+            if not agent.reuse_beliefs(news, self.market.current_price, market_sentiment)
+        ]
+        responses = await llm_client.agenerate_batch([
+            agent.build_belief_messages(news, self.market.current_price, market_sentiment)
+            for agent in pending
+        ], temperature=BELIEF_TEMPERATURE, semantic_keys=[
+            agent.belief_semantic_key(news, self.market.current_price, market_sentiment)
+            for agent in pending
+        ])
+        for agent, response in zip(pending, responses):
+            agent.apply_belief_response(response, news)
+        
+        # 4. agents form intentions (one batched LLM call for the agents whose situation changed)
+        agent_intentions = [agent.reuse_intention(self.market.current_price) for agent in self.agents]
+        pending = [i for i, intention in enumerate(agent_intentions) if intention is None]
+        if llm_client.is_mock:
+            responses = [self.agents[i].mock_intention_response() for i in pending]
+        else:
+            responses = await llm_client.agenerate_batch([
+                self.agents[i].build_intention_messages(self.market.current_price)
+                for i in pending
+            ], temperature=INTENTION_TEMPERATURE)
+        for i, response in zip(pending, responses):
+            agent_intentions[i] = self.agents[i].apply_intention_response(response, self.market.current_price)
+        
+        # 5. agents execute trades, in the same pass as collecting intentions and agent states
+        #    (trades are recorded under the timestep of this step, i.e. after the market update)
+        step_timestep = self.market.timestep + 1
         intentions = []
-        for agent in self.agents:
-            intention = agent.form_intention(self.market.current_price)
+        trades = []
+        for i, (agent, intention) in enumerate(zip(self.agents, agent_intentions)):
             intentions.append({
                 'agent_name': agent.name,
                 'agent_type': agent.agent_type,
                 'intention': intention
             })
-        
-        # 5. agents execute trades
-        trades = []
-        for agent in self.agents:
-            intention = agent.intentions[-1] if agent.intentions else None
             if intention:
-                trade = agent.execute_trade(intention, self.market.current_price)
+                trade = agent.execute_trade(intention, self.market.current_price, step_timestep)
                 if trade:
                     trade['agent_name'] = agent.name
                     trade['agent_type'] = agent.agent_type
+                    self._trade_qsigned[len(trades)] = trade['quantity'] if trade['action'] == 'buy' else -trade['quantity']
                     trades.append(trade)
+            self._cash[i] = agent.cash
+            self._shares[i] = agent.shares
+            self._scores[i] = agent.get_sentiment_score()
         
         # 6. update market
-        self.market.update(trades, news)
+        self.market.update(trades, news, self._trade_qsigned[:len(trades)])
         
         # 7. record history
         step_data = {
@@ -85,21 +147,18 @@ class MarketSimulator:
         }
         
         self.simulation_history.append(step_data)
+        self._trade_count += len(trades)
         return step_data
     
     def _calculate_market_sentiment(self) -> Dict:
         """calculate market sentiment distribution"""
-        sentiment_scores = {'optimistic': [], 'pessimistic': [], 'calm': []}
+        for i, agent in enumerate(self.agents):
+            self._scores[i] = agent.get_sentiment_score()
         
-        for agent in self.agents:
-            score = agent.get_sentiment_score()
-            sentiment_scores[agent.agent_type].append(score)
-        
-        # calculate average sentiment
+        # calculate average sentiment of each type
         market_sentiment = {
-            'optimistic': np.mean(sentiment_scores['optimistic']) if sentiment_scores['optimistic'] else 0.0,
-            'pessimistic': np.mean(sentiment_scores['pessimistic']) if sentiment_scores['pessimistic'] else 0.0,
-            'calm': np.mean(sentiment_scores['calm']) if sentiment_scores['calm'] else 0.0
+            agent_type: self._scores[indices].mean() if len(indices) else 0.0
+            for agent_type, indices in self._agent_groups.items()
         }
         
         # record sentiment history
@@ -107,42 +166,35 @@ class MarketSimulator:
         
         return market_sentiment
     
-    def _get_agent_states(self) -> List[Dict]:
-        """get all agent states"""
-        states = []
-        for agent in self.agents:
-            states.append({
-                'name': agent.name,
-                'type': agent.agent_type,
-                'cash': agent.cash,
-                'shares': agent.shares,
-                'portfolio_value': agent.get_portfolio_value(self.market.current_price),
-                'sentiment_score': agent.get_sentiment_score(),
-                'market_outlook': agent.beliefs.get('market_outlook', 'unknown')
-            })
-        return states
+    def _get_agent_states(self) -> Dict:
+        """
+        get all agent states as columns (one entry per agent, accepted by pd.DataFrame)
+        from the cash, shares and scores filled in the trade pass of astep
+        """
+        return {
+            'name': self._names,
+            'type': self._types,
+            'cash': self._cash.copy(),
+            'shares': self._shares.copy(),
+            'portfolio_value': self._cash + self._shares * self.market.current_price,
+            'sentiment_score': self._scores.copy(),
+            'market_outlook': [agent.beliefs.get('market_outlook', 'unknown') for agent in self.agents]
+        }
     
     def reset(self):
         """reset simulator"""
-        self.market = Market(self.market.initial_price)
+        self.market = Market(self.market.initial_price, self.history_capacity)
         self.agents = []
-        self.simulation_history = []
+        self.simulation_history = self._new_history()
+        self._trade_count = 0
         self._create_agents()
     
     def get_statistics(self) -> Dict:
         """get simulation statistics"""
         stats = self.market.get_market_statistics()
         
-        # add agent statistics - count trades from simulation history (more accurate)
-        total_trades = 0
-        for step_data in self.simulation_history:
-            trades = step_data.get('trades', [])
-            total_trades += len(trades)
-        
-        # Also count from agent trade history as backup
-        agent_trade_count = sum(len(agent.trade_history) for agent in self.agents)
-        # Use the larger value to ensure accuracy
-        stats['total_trades'] = max(total_trades, agent_trade_count)
+        # add agent statistics - trades counted while stepping (the history may be bounded)
+        stats['total_trades'] = self._trade_count
         stats['num_agents'] = len(self.agents)
         
         return stats
@@ -1,28 +1,15 @@
-"""Test all modules can be imported normally"""
+"""Test all modules can be imported normally (and time each import)"""
+import importlib
+import time
+
+MODULES = ('config', 'llm_client', 'market', 'agent', 'simulator', 'app')
+
 try:
-    print("Testing import config...")
-    import config
-    print("[OK] config imported successfully")
-    
-    print("Testing import llm_client...")
-    import llm_client
-    print("[OK] llm_client imported successfully")
-    
-    print("Testing import market...")
-    import market
-    print("[OK] market imported successfully")
-    
-    print("Testing import agent...")
-    import agent
-    print("[OK] agent imported successfully")
-    
-    print("Testing import simulator...")
-    import simulator
-    print("[OK] simulator imported successfully")
-    
-    print("Testing import app...")
-    import app
-    print("[OK] app imported successfully")
+    for module in MODULES:
+        print(f"Testing import {module}...")
+        start = time.perf_counter()
+        importlib.import_module(module)
+        print(f"[OK] {module} imported successfully ({(time.perf_counter() - start) * 1000:.1f} ms)")
     
     print("\nAll modules imported successfully!")
     
@@ -30,4 +17,3 @@ except Exception as e:
     print(f"\n[ERROR] Import error: {e}")
     import traceback
     traceback.print_exc()
-
@@ -0,0 +1,116 @@
+"""Test the semantic LLM cache with a stub encoder (run: python -m unittest test_llm_cache)"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import llm_cache
+from llm_cache import SemanticCache
+
+# fixed unit embeddings: 'rally' and 'rally again' are close, the others orthogonal
+EMBEDDINGS = {
+    'rally': [1.0, 0.0, 0.0, 0.0],
+    'rally again': [0.96, 0.28, 0.0, 0.0],
+    'crash': [0.0, 0.0, 1.0, 0.0],
+    'flat': [0.0, 0.0, 0.0, 1.0],
+}
+
+
+class StubEncoder:
+    """stands in for SentenceTransformer: looks embeddings up in EMBEDDINGS"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, text, normalize_embeddings=True):
+        return np.array(EMBEDDINGS[text])
+
+
+class NegativeHash:
+    """namespace whose hash is a fixed negative number below -1"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return self.value
+
+    def __eq__(self, other):
+        return isinstance(other, NegativeHash) and self.value == other.value
+
+
+class SemanticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(llm_cache, '_import_sentence_transformers', return_value=StubEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_encoder_loaded_on_first_use(self):
+        cache = SemanticCache('stub')
+        self.assertIsNone(cache.encoder)
+        self.assertIsNone(cache.get('ns', 'rally'))
+        self.assertIsInstance(cache.encoder, StubEncoder)
+
+    def test_similar_text_hits_within_namespace_only(self):
+        cache = SemanticCache('stub', threshold=0.9)
+        cache.put(('belief', 'optimistic'), 'rally', 'R1')
+        self.assertEqual(cache.get(('belief', 'optimistic'), 'rally'), 'R1')
+        self.assertEqual(cache.get(('belief', 'optimistic'), 'rally again'), 'R1')
+        self.assertIsNone(cache.get(('belief', 'optimistic'), 'crash'))
+        self.assertIsNone(cache.get(('belief', 'pessimistic'), 'rally'))
+
+    def test_same_text_in_several_namespaces(self):
+        cache = SemanticCache('stub', capacity=4)
+        for i in range(4):
+            cache.put(('ns', i), 'rally', f'R{i}')
+        for i in range(4):
+            self.assertEqual(cache.get(('ns', i), 'rally'), f'R{i}')
+
+    def test_negative_namespace_hashes_use_free_slots(self):
+        cache = SemanticCache('stub', capacity=8)
+        namespaces = [NegativeHash(-2 - i) for i in range(4)]
+        for i, namespace in enumerate(namespaces):
+            cache.put(namespace, 'rally', f'R{i}')
+        self.assertEqual(len(cache._entries), 4)
+        for i, namespace in enumerate(namespaces):
+            self.assertEqual(cache.get(namespace, 'rally'), f'R{i}')
+
+    def test_least_recently_used_is_evicted(self):
+        cache = SemanticCache('stub', capacity=2)
+        cache.put('a', 'rally', 'RA')
+        cache.put('b', 'crash', 'RB')
+        self.assertEqual(cache.get('a', 'rally'), 'RA')  # 'b' is now least recently used
+        cache.put('c', 'flat', 'RC')
+        self.assertEqual(len(cache._entries), 2)
+        self.assertEqual(cache.get('a', 'rally'), 'RA')
+        self.assertIsNone(cache.get('b', 'crash'))
+        self.assertEqual(cache.get('c', 'flat'), 'RC')
+
+    def test_expired_entry_is_dropped(self):
+        cache = SemanticCache('stub', ttl=60.0)
+        with mock.patch.object(llm_cache.time, 'monotonic', return_value=1000.0):
+            cache.put('a', 'rally', 'RA')
+            cache.put('b', 'crash', 'RB')
+        with mock.patch.object(llm_cache.time, 'monotonic', return_value=1030.0):
+            self.assertEqual(cache.get('a', 'rally'), 'RA')
+        with mock.patch.object(llm_cache.time, 'monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get('a', 'rally'))
+        self.assertEqual(len(cache._entries), 1)
+        # the freed slot is reused
+        cache.put('c', 'flat', 'RC')
+        self.assertEqual(cache.get('c', 'flat'), 'RC')
+        self.assertEqual(len(cache._entries), 2)
+
+    def test_disabled_without_sentence_transformers(self):
+        with mock.patch.object(llm_cache, '_import_sentence_transformers', return_value=None):
+            cache = SemanticCache('stub')
+            cache.put('a', 'rally', 'RA')
+            self.assertIsNone(cache.get('a', 'rally'))
+
+
+if __name__ == '__main__':
+    unittest.main()